@@ -0,0 +1,76 @@
+"""
+Mide el throughput de escritura de save_message según el número de shards.
+
+Lanza varios procesos (como los workers de uvicorn) que guardan mensajes en
+sesiones aleatorias durante unos segundos, sobre bases de datos temporales.
+Por defecto se crean en el directorio temporal del sistema, que puede ser un
+tmpfs en memoria; con --dir se usa el disco donde vivirá bytewise.db:
+
+    python benchmarks/shard_writes.py
+    python benchmarks/shard_writes.py --shards 1 2 4 8 --workers 8 --seconds 5
+    python benchmarks/shard_writes.py --dir /srv/bytewise
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def write_loop(shards: int, database_path: str, session_ids: list, seconds: float, start, results):
+    """Guarda mensajes en sesiones aleatorias hasta agotar el tiempo."""
+    main.configure_shards(shards, database_path)
+    rng = random.Random(os.getpid())
+    start.wait()
+    writes = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        main.save_message(rng.choice(session_ids), "user", "x" * 200)
+        writes += 1
+    results.put(writes)
+
+
+def run(shards: int, workers: int, seconds: float, sessions: int, directory: str = None) -> float:
+    """Devuelve las escrituras por segundo con N shards y W procesos."""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        database_path = os.path.join(tmp, "bytewise.db")
+        main.configure_shards(shards, database_path)
+        main.init_database()
+        session_ids = [main.create_session(f"bench-{i}") for i in range(sessions)]
+
+        start = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=write_loop, args=(shards, database_path, session_ids, seconds, start, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        start.set()
+        total = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+    return total / seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput de escritura por número de shards")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--dir", default=None, help="Directorio para las bases de datos (por defecto el temporal del sistema)")
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{args.workers} procesos, {args.seconds:g} s por configuración, en {args.dir or tempfile.gettempdir()}")
+    for shards in args.shards:
+        rate = run(shards, args.workers, args.seconds, args.sessions, args.dir)
+        baseline = baseline or rate
+        print(f"{shards:>3} shard(s): {rate:>9.0f} escrituras/s  (x{rate / baseline:.2f})")
@@ -1,20 +1,60 @@
 import os
+import asyncio
+import hashlib
+import heapq
 import sqlite3
+import time
 import uuid
+import zlib
 from datetime import datetime
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, Header, HTTPException, Response, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from openai import OpenAI
+from fastapi.responses import JSONResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from dotenv import load_dotenv
-import uvicorn
+from pydantic import BaseModel, StringConstraints
+import orjson
 import re
-from typing import Optional
-from contextlib import contextmanager
+from typing import Annotated, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 
-# Cargar variables de entorno
-load_dotenv()
+# Segundos que uvicorn espera a las peticiones en curso (y sus llamadas al LLM)
+# al apagar el servidor antes de cancelarlas. Los WebSockets se cierran con 1012
+# al empezar el apagado; solo se espera a la respuesta que se esté generando
+SHUTDOWN_DRAIN_TIMEOUT = 60
 
-app = FastAPI(title="ByteWise API", version="1.0.0")
+class ORJSONResponse(JSONResponse):
+    """Respuesta JSON serializada con orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Inicializa el servidor al arrancar cada worker.
+    
+    Al apagar no hay nada que drenar aquí: uvicorn deja de aceptar conexiones,
+    cierra los WebSockets con 1012 y espera a las peticiones en curso (hasta
+    timeout_graceful_shutdown) antes de ejecutar la parte de apagado del lifespan.
+    """
+    started = time.perf_counter()
+
+    # Cargar variables de entorno
+    load_dotenv()
+    if not os.getenv("OPENAI_API_KEY"):
+        raise ValueError("OPENAI_API_KEY no configurada en .env")
+
+    configure_shards(int(os.getenv("DATABASE_SHARDS", "1")))
+    await run_in_threadpool(check_shards)
+    await run_in_threadpool(init_database)
+    print(f"Worker {os.getpid()} listo en {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    yield
+
+app = FastAPI(title="ByteWise API", version="1.0.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Configurar CORS para permitir conexiones desde el frontend
 app.add_middleware(
@@ -23,63 +63,194 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-# Configurar OpenAI con la nueva API
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-if not client.api_key:
-    raise ValueError("OPENAI_API_KEY no configurada en .env")
+# Cliente de OpenAI, creado en el primer uso
+_client = None
+
+def get_client():
+    """Devuelve el cliente de OpenAI, creándolo la primera vez que se necesita."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 # ============================================
 # CONFIGURACIÓN DE BASE DE DATOS SQLite
 # ============================================
 DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bytewise.db")
 
+# Ficheros entre los que se reparten las sesiones. Con un solo shard se usa
+# bytewise.db tal cual; con N > 1, bytewise-<i>-of-<N>.db (ver configure_shards).
+SHARD_PATHS = [DATABASE_PATH]
+
+_shard_executor: Optional[ThreadPoolExecutor] = None
+
+def get_shard_paths(shards: int, database_path: Optional[str] = None) -> list:
+    """Devuelve las rutas de los ficheros para una configuración de N shards."""
+    database_path = database_path or DATABASE_PATH
+    if shards <= 1:
+        return [database_path]
+    base, ext = os.path.splitext(database_path)
+    return [f"{base}-{i}-of-{shards}{ext}" for i in range(shards)]
+
+def configure_shards(shards: int, database_path: Optional[str] = None):
+    """Activa el reparto de sesiones entre N ficheros SQLite."""
+    global SHARD_PATHS, _shard_executor
+    SHARD_PATHS = get_shard_paths(shards, database_path)
+    if _shard_executor is not None:
+        _shard_executor.shutdown(wait=False)
+        _shard_executor = None
+
+def shard_index(session_id: str, shards: int) -> int:
+    """Shard al que pertenece una sesión (hash estable entre procesos)."""
+    return zlib.crc32(session_id.encode("utf-8")) % shards
+
+def shard_path(session_id: str) -> str:
+    """Ruta del fichero que guarda una sesión."""
+    if len(SHARD_PATHS) == 1:
+        return SHARD_PATHS[0]
+    return SHARD_PATHS[shard_index(session_id, len(SHARD_PATHS))]
+
+def scatter(query) -> list:
+    """Ejecuta query(ruta) en todos los shards, en paralelo si hay varios."""
+    global _shard_executor
+    if len(SHARD_PATHS) == 1:
+        return [query(SHARD_PATHS[0])]
+    if _shard_executor is None:
+        _shard_executor = ThreadPoolExecutor(max_workers=len(SHARD_PATHS), thread_name_prefix="shard")
+    return list(_shard_executor.map(query, SHARD_PATHS))
+
 @contextmanager
-def get_db():
-    """Context manager para conexiones a la base de datos."""
-    conn = sqlite3.connect(DATABASE_PATH)
+def get_db(path: Optional[str] = None):
+    """Context manager para conexiones a la base de datos (por defecto, el primer shard)."""
+    conn = sqlite3.connect(path or SHARD_PATHS[0])
     conn.row_factory = sqlite3.Row
     try:
         yield conn
     finally:
         conn.close()
 
-def init_database():
-    """Inicializa las tablas de la base de datos."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Tabla de sesiones de entrevista
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sessions (
-                id TEXT PRIMARY KEY,
-                candidate_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'active',
-                total_questions INTEGER DEFAULT 0,
-                correct_answers INTEGER DEFAULT 0
-            )
-        """)
-        
-        # Tabla de mensajes
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES sessions(id)
-            )
-        """)
-        
-        conn.commit()
-        print(f"Base de datos inicializada en: {DATABASE_PATH}")
+# Migraciones del esquema, en orden. El número aplicado se guarda en
+# PRAGMA user_version; solo se añaden entradas nuevas al final.
+SCHEMA_MIGRATIONS = [
+    # 1: tablas de sesiones y mensajes
+    [
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            candidate_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'active',
+            total_questions INTEGER DEFAULT 0,
+            correct_answers INTEGER DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sessions(id)
+        )
+        """,
+    ],
+    # 2: índices para historiales y para calcular ETags sin leer filas
+    [
+        "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at)",
+    ],
+    # 3: contador de cambios en sessions (ETag del listado). Los triggers lo
+    # incrementan en la misma transacción que cada alta, cambio o borrado.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS sessions_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO sessions_version (id, version) VALUES (1, 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS sessions_version_insert AFTER INSERT ON sessions
+        BEGIN UPDATE sessions_version SET version = version + 1 WHERE id = 1; END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS sessions_version_update AFTER UPDATE ON sessions
+        BEGIN UPDATE sessions_version SET version = version + 1 WHERE id = 1; END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS sessions_version_delete AFTER DELETE ON sessions
+        BEGIN UPDATE sessions_version SET version = version + 1 WHERE id = 1; END
+        """,
+    ],
+]
+
+def migrate_database(path: str):
+    """
+    Aplica las migraciones pendientes a un fichero.
+    
+    Es seguro llamarla desde varios workers a la vez: BEGIN IMMEDIATE toma el
+    bloqueo de escritura de SQLite, así que solo el primero ejecuta el DDL y el
+    resto espera y encuentra el esquema ya actualizado.
+    """
+    with get_db(path) as conn:
+        conn.isolation_level = None
+        # WAL permite lecturas concurrentes mientras otro worker escribe
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, statements in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {number}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    if version < len(SCHEMA_MIGRATIONS):
+        print(f"Base de datos migrada a la versión {len(SCHEMA_MIGRATIONS)} en: {path}")
 
-# Inicializar la base de datos al arrancar
-init_database()
+def count_sessions(path: str) -> int:
+    """Número de sesiones en un fichero (0 si no existe o aún no tiene esquema)."""
+    if not os.path.exists(path):
+        return 0
+    with get_db(path) as conn:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'").fetchone() is None:
+            return 0
+        return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+def check_shards():
+    """
+    Comprueba que los shards configurados corresponden a los datos en disco.
+    
+    Con DATABASE_SHARDS=N > 1 y sin haber ejecutado reshard.py, init_database
+    crearía shards vacíos y el servidor arrancaría sin ninguna sesión anterior.
+    """
+    if len(SHARD_PATHS) == 1:
+        return
+    missing = [path for path in SHARD_PATHS if not os.path.exists(path)]
+    if missing and len(missing) < len(SHARD_PATHS):
+        raise ValueError(
+            f"Faltan shards de DATABASE_SHARDS={len(SHARD_PATHS)}: {', '.join(missing)}. "
+            "Comprueba el valor de DATABASE_SHARDS o vuelve a ejecutar reshard.py"
+        )
+    if count_sessions(DATABASE_PATH) and not any(count_sessions(path) for path in SHARD_PATHS):
+        raise ValueError(
+            f"{DATABASE_PATH} tiene sesiones pero los shards de DATABASE_SHARDS={len(SHARD_PATHS)} "
+            f"están vacíos. Ejecuta antes: python reshard.py --to {len(SHARD_PATHS)}"
+        )
+
+def init_database():
+    """Aplica las migraciones pendientes en todos los shards."""
+    for path in SHARD_PATHS:
+        migrate_database(path)
 
 # ============================================
 # FUNCIONES DE BASE DE DATOS
@@ -88,10 +259,12 @@ init_database()
 def create_session(candidate_name: Optional[str] = None) -> str:
     """Crea una nueva sesión de entrevista."""
     session_id = str(uuid.uuid4())
-    with get_db() as conn:
+    with get_db(shard_path(session_id)) as conn:
         cursor = conn.cursor()
+        # updated_at con milisegundos, igual que en update_session
         cursor.execute(
-            "INSERT INTO sessions (id, candidate_name) VALUES (?, ?)",
+            "INSERT INTO sessions (id, candidate_name, updated_at) "
+            "VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'))",
             (session_id, candidate_name)
         )
         conn.commit()
@@ -99,7 +272,7 @@ def create_session(candidate_name: Optional[str] = None) -> str:
 
 def get_session(session_id: str) -> Optional[dict]:
     """Obtiene los datos de una sesión."""
-    with get_db() as conn:
+    with get_db(shard_path(session_id)) as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM sessions WHERE id = ?", (session_id,))
         row = cursor.fetchone()
@@ -109,29 +282,41 @@ def get_session(session_id: str) -> Optional[dict]:
 
 def update_session(session_id: str, **kwargs):
     """Actualiza los datos de una sesión."""
-    with get_db() as conn:
+    with get_db(shard_path(session_id)) as conn:
         cursor = conn.cursor()
         updates = ", ".join([f"{k} = ?" for k in kwargs.keys()])
         values = list(kwargs.values()) + [session_id]
         cursor.execute(
-            f"UPDATE sessions SET {updates}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            f"UPDATE sessions SET {updates}, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = ?",
             values
         )
         conn.commit()
 
-def save_message(session_id: str, role: str, content: str):
-    """Guarda un mensaje en la base de datos."""
-    with get_db() as conn:
+def increment_session_questions(session_id: str):
+    """Suma una pregunta al contador de la sesión (atómico frente a otras conexiones)."""
+    with get_db(shard_path(session_id)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE sessions SET total_questions = COALESCE(total_questions, 0) + 1, "
+            "updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = ?",
+            (session_id,)
+        )
+        conn.commit()
+
+def save_message(session_id: str, role: str, content: str) -> int:
+    """Guarda un mensaje en la base de datos y devuelve su ID."""
+    with get_db(shard_path(session_id)) as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
             (session_id, role, content)
         )
         conn.commit()
+        return cursor.lastrowid
 
 def get_session_messages(session_id: str) -> list:
     """Obtiene todos los mensajes de una sesión."""
-    with get_db() as conn:
+    with get_db(shard_path(session_id)) as conn:
         cursor = conn.cursor()
         cursor.execute(
             "SELECT role, content FROM messages WHERE session_id = ? ORDER BY created_at",
@@ -139,15 +324,74 @@ def get_session_messages(session_id: str) -> list:
         )
         return [{"role": row["role"], "content": row["content"]} for row in cursor.fetchall()]
 
-def get_all_sessions() -> list:
-    """Obtiene todas las sesiones."""
-    with get_db() as conn:
+def get_session_messages_after(session_id: str, after_message_id: Optional[int] = None) -> list:
+    """Obtiene los mensajes de una sesión (con su ID) posteriores a after_message_id."""
+    with get_db(shard_path(session_id)) as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT * FROM sessions ORDER BY updated_at DESC"
+            "SELECT id, role, content FROM messages WHERE session_id = ? AND id > ? ORDER BY id",
+            (session_id, after_message_id or 0)
         )
         return [dict(row) for row in cursor.fetchall()]
 
+def get_session_version(session_id: str) -> Optional[tuple]:
+    """Devuelve (updated_at, último ID de mensaje) de una sesión usando solo índices."""
+    with get_db(shard_path(session_id)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT updated_at, (SELECT MAX(id) FROM messages WHERE session_id = ?) FROM sessions WHERE id = ?",
+            (session_id, session_id)
+        )
+        row = cursor.fetchone()
+        return tuple(row) if row else None
+
+def get_session_snapshot(session_id: str, after_message_id: Optional[int] = None) -> Optional[tuple]:
+    """
+    Lee una sesión, sus mensajes posteriores a after_message_id y su último ID
+    de mensaje en una sola transacción de lectura, para que los tres describan
+    el mismo estado aunque otro worker escriba a la vez.
+    """
+    with get_db(shard_path(session_id)) as conn:
+        conn.isolation_level = None
+        conn.execute("BEGIN")
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM sessions WHERE id = ?", (session_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            cursor.execute(
+                "SELECT id, role, content FROM messages WHERE session_id = ? AND id > ? ORDER BY id",
+                (session_id, after_message_id or 0)
+            )
+            messages = [dict(message) for message in cursor.fetchall()]
+            cursor.execute("SELECT MAX(id) FROM messages WHERE session_id = ?", (session_id,))
+            last_message_id = cursor.fetchone()[0]
+            return dict(row), messages, last_message_id
+        finally:
+            conn.execute("COMMIT")
+
+def get_sessions_version() -> tuple:
+    """Devuelve el contador de cambios de sessions de cada shard."""
+    def query(path):
+        with get_db(path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM sessions_version WHERE id = 1")
+            return cursor.fetchone()[0]
+    return tuple(scatter(query))
+
+def get_all_sessions() -> list:
+    """Obtiene todas las sesiones, de la más reciente a la más antigua."""
+    def query(path):
+        with get_db(path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM sessions ORDER BY updated_at DESC"
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    # Cada shard ya viene ordenado: basta con intercalarlos
+    return list(heapq.merge(*scatter(query), key=lambda row: row["updated_at"] or "", reverse=True))
+
 
 # Contexto del sistema para el entrevistador
 INTERVIEWER_CONTEXT = """
@@ -267,20 +511,170 @@ def extraer_nombre(texto):
     # Si no encuentra, devuelve saludo genérico
     return None
 
+def build_interview_messages(chat_history: list, user_message: str) -> list:
+    """Construye los mensajes para el modelo a partir del historial y el nuevo mensaje."""
+    # FLUJO: Si no hay historial, el usuario se está presentando
+    if not chat_history:
+        nombre = extraer_nombre(user_message)
+        
+        # Dejamos que GPT maneje todo el saludo de forma natural
+        if nombre:
+            prompt_inicio = f"El candidato se ha presentado diciendo: '{user_message}'. Su nombre es {nombre}. Salúdale brevemente de forma natural y amigable, y hazle directamente tu primera pregunta técnica de la entrevista. No uses frases como 'Excelente' o 'Perfecto' después del saludo, ve directo a la pregunta."
+        else:
+            prompt_inicio = f"El candidato se ha presentado diciendo: '{user_message}'. Salúdale brevemente de forma natural y hazle directamente tu primera pregunta técnica de la entrevista. No uses frases como 'Excelente' o 'Perfecto' después del saludo, ve directo a la pregunta."
+        
+        return [
+            {"role": "system", "content": INTERVIEWER_CONTEXT},
+            {"role": "user", "content": prompt_inicio}
+        ]
+
+    # Flujo normal de entrevista
+    return [{"role": "system", "content": INTERVIEWER_CONTEXT}] + chat_history + [{"role": "user", "content": user_message}]
+
+def request_completion(messages: list, stream: bool = False):
+    """Llama al modelo del entrevistador con los parámetros comunes."""
+    return get_client().chat.completions.create(
+        model="gpt-4",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=500,
+        stream=stream
+    )
+
+class SessionNotFoundError(Exception):
+    """La sesión solicitada no existe."""
+
+def run_chat_turn(user_message: str, session_id: Optional[str] = None) -> dict:
+    """
+    Ejecuta un turno completo de la entrevista.
+    
+    Si no se indica session_id se crea una sesión nueva a partir de la
+    presentación del candidato. Guarda ambos mensajes y devuelve la respuesta
+    del asistente junto con el ID de sesión.
+    """
+    if session_id:
+        session = get_session(session_id)
+        if not session:
+            raise SessionNotFoundError(session_id)
+        
+        # Obtener historial de la BD
+        chat_history = get_session_messages(session_id)
+    else:
+        # Crear nueva sesión automáticamente
+        session_id = create_session(extraer_nombre(user_message))
+        chat_history = []
+
+    messages = build_interview_messages(chat_history, user_message)
+
+    # Guardar mensaje del usuario
+    save_message(session_id, "user", user_message)
+
+    response = request_completion(messages)
+    assistant_message = response.choices[0].message.content.strip()
+    
+    # Guardar respuesta del asistente
+    save_message(session_id, "assistant", assistant_message)
+    
+    # Actualizar contador de preguntas
+    increment_session_questions(session_id)
+
+    return {
+        "message": assistant_message,
+        "session_id": session_id
+    }
+
+# ============================================
+# MODELOS DE PETICIÓN Y RESPUESTA
+# ============================================
+
+NonEmptyStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
+class CreateSessionRequest(BaseModel):
+    candidate_name: Optional[str] = None
+
+class ChatRequest(BaseModel):
+    message: NonEmptyStr
+    session_id: Optional[str] = None
+
+class ContinueSessionRequest(BaseModel):
+    message: NonEmptyStr
+
+class SessionOut(BaseModel):
+    id: str
+    candidate_name: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    status: Optional[str] = None
+    total_questions: int = 0
+    correct_answers: int = 0
+
+class MessageOut(BaseModel):
+    id: Optional[int] = None
+    role: str
+    content: str
+
+class SessionCreatedResponse(BaseModel):
+    session_id: str
+    candidate_name: Optional[str] = None
+    message: str
+
+class SessionListResponse(BaseModel):
+    sessions: list[SessionOut]
+    total: int
+
+class SessionDetailResponse(BaseModel):
+    session: SessionOut
+    messages: list[MessageOut]
+    message_count: int
+    last_message_id: Optional[int] = None
+
+class ChatResponse(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+    error: Optional[str] = None
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """Devuelve los errores de validación en un formato compacto."""
+    errors = [
+        {
+            "field": ".".join(part for part in err["loc"] if isinstance(part, str) and part != "body") or "body",
+            "message": err["msg"]
+        }
+        for err in exc.errors()
+    ]
+    return ORJSONResponse(status_code=422, content={"detail": "Solicitud inválida", "errors": errors})
+
+def make_etag(*parts) -> str:
+    """Construye un ETag fuerte a partir de los valores que identifican una versión."""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comprueba una cabecera If-None-Match (comparación débil, RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+# Obliga al navegador a revalidar con If-None-Match en cada petición
+CACHE_HEADERS = {"Cache-Control": "no-cache"}
+
 @app.get("/")
 async def health_check():
     """Endpoint de salud para verificar que el API está funcionando."""
-    return {"status": "ok", "message": "ByteWise API is running", "database": DATABASE_PATH}
+    return {"status": "ok", "message": "ByteWise API is running", "database": DATABASE_PATH, "shards": len(SHARD_PATHS)}
 
 # ============================================
 # ENDPOINTS DE SESIONES
 # ============================================
 
-@app.post("/sessions")
-async def create_new_session(request: Request):
+@app.post("/sessions", response_model=SessionCreatedResponse)
+async def create_new_session(data: Optional[CreateSessionRequest] = None):
     """Crea una nueva sesión de entrevista."""
-    data = await request.json()
-    candidate_name = data.get("candidate_name")
+    candidate_name = data.candidate_name if data else None
     session_id = create_session(candidate_name)
     return {
         "session_id": session_id,
@@ -288,25 +682,55 @@ async def create_new_session(request: Request):
         "message": "Sesión creada exitosamente"
     }
 
-@app.get("/sessions")
-async def list_sessions():
-    """Lista todas las sesiones de entrevista."""
+@app.get("/sessions", response_model=SessionListResponse)
+async def list_sessions(if_none_match: Optional[str] = Header(None)):
+    """Lista todas las sesiones de entrevista (admite If-None-Match)."""
+    etag = make_etag("sessions", get_sessions_version())
+    headers = {"ETag": etag, **CACHE_HEADERS}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
     sessions = get_all_sessions()
-    return {"sessions": sessions, "total": len(sessions)}
+    return ORJSONResponse({"sessions": sessions, "total": len(sessions)}, headers=headers)
 
-@app.get("/sessions/{session_id}")
-async def get_session_details(session_id: str):
-    """Obtiene los detalles de una sesión específica."""
-    session = get_session(session_id)
-    if not session:
+@app.get("/sessions/{session_id}", response_model=SessionDetailResponse)
+async def get_session_details(
+    session_id: str,
+    after_message_id: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Obtiene los detalles de una sesión específica (admite If-None-Match).
+    
+    Parámetros:
+    - after_message_id: (opcional) devuelve solo los mensajes posteriores a este ID
+    """
+    version = get_session_version(session_id)
+    if not version:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
     
-    messages = get_session_messages(session_id)
-    return {
+    updated_at, last_message_id = version
+    etag = make_etag(session_id, updated_at, last_message_id, after_message_id)
+    headers = {"ETag": etag, **CACHE_HEADERS}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    snapshot = get_session_snapshot(session_id, after_message_id)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    
+    # El ETag se recalcula con la misma lectura que el cuerpo: si algo cambió
+    # desde la comprobación anterior, describe lo que realmente se devuelve
+    session, messages, last_message_id = snapshot
+    headers["ETag"] = make_etag(session_id, session["updated_at"], last_message_id, after_message_id)
+    # Las filas vienen de nuestra propia BD: se serializan directamente con
+    # orjson sin revalidarlas contra el modelo (transcripciones largas)
+    return ORJSONResponse({
         "session": session,
         "messages": messages,
-        "message_count": len(messages)
-    }
+        "message_count": len(messages),
+        "last_message_id": last_message_id
+    }, headers=headers)
 
 @app.delete("/sessions/{session_id}")
 async def delete_session(session_id: str):
@@ -315,7 +739,7 @@ async def delete_session(session_id: str):
     if not session:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
     
-    with get_db() as conn:
+    with get_db(shard_path(session_id)) as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
         cursor.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
@@ -327,105 +751,23 @@ async def delete_session(session_id: str):
 # ENDPOINT DE CHAT CON PERSISTENCIA
 # ============================================
 
-@app.post("/chat")
-async def chat_endpoint(request: Request):
+@app.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
+async def chat_endpoint(data: ChatRequest):
     """
     Endpoint principal de chat con persistencia.
     
     Parámetros:
     - message: El mensaje del usuario
     - session_id: (opcional) ID de sesión existente para continuar
-    - history: (opcional, legacy) Historial de mensajes si no se usa session_id
     """
-    data = await request.json()
-    user_message = data.get("message", "").strip()
-    session_id = data.get("session_id")
-
-    if not user_message:
-        raise HTTPException(status_code=400, detail="Mensaje vacío")
+    return await _chat(data.message, data.session_id)
 
+async def _chat(user_message: str, session_id: Optional[str]) -> dict:
+    """Ejecuta un turno de chat fuera del event loop y traduce los errores a HTTP."""
     try:
-        # Si hay session_id, recuperar historial de la base de datos
-        if session_id:
-            session = get_session(session_id)
-            if not session:
-                raise HTTPException(status_code=404, detail="Sesión no encontrada")
-            
-            # Obtener historial de la BD
-            chat_history = get_session_messages(session_id)
-            
-            # Guardar mensaje del usuario
-            save_message(session_id, "user", user_message)
-        else:
-            # Crear nueva sesión automáticamente
-            nombre = extraer_nombre(user_message)
-            session_id = create_session(nombre)
-            chat_history = []
-            
-            # Guardar mensaje del usuario
-            save_message(session_id, "user", user_message)
-            
-            # Actualizar nombre del candidato si se extrajo
-            if nombre:
-                update_session(session_id, candidate_name=nombre)
-
-        # FLUJO: Si no hay historial, el usuario se está presentando
-        if not chat_history:
-            nombre = extraer_nombre(user_message)
-            
-            # Dejamos que GPT maneje todo el saludo de forma natural
-            if nombre:
-                prompt_inicio = f"El candidato se ha presentado diciendo: '{user_message}'. Su nombre es {nombre}. Salúdale brevemente de forma natural y amigable, y hazle directamente tu primera pregunta técnica de la entrevista. No uses frases como 'Excelente' o 'Perfecto' después del saludo, ve directo a la pregunta."
-            else:
-                prompt_inicio = f"El candidato se ha presentado diciendo: '{user_message}'. Salúdale brevemente de forma natural y hazle directamente tu primera pregunta técnica de la entrevista. No uses frases como 'Excelente' o 'Perfecto' después del saludo, ve directo a la pregunta."
-            
-            messages = [
-                {"role": "system", "content": INTERVIEWER_CONTEXT},
-                {"role": "user", "content": prompt_inicio}
-            ]
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
-            assistant_message = response.choices[0].message.content.strip()
-            
-            # Guardar respuesta del asistente
-            save_message(session_id, "assistant", assistant_message)
-            
-            # Actualizar contador de preguntas
-            update_session(session_id, total_questions=1)
-            
-            return {
-                "message": assistant_message,
-                "session_id": session_id
-            }
-
-        # Flujo normal de entrevista
-        messages = [{"role": "system", "content": INTERVIEWER_CONTEXT}] + chat_history + [{"role": "user", "content": user_message}]
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=500
-        )
-        assistant_message = response.choices[0].message.content.strip()
-        
-        # Guardar respuesta del asistente
-        save_message(session_id, "assistant", assistant_message)
-        
-        # Actualizar contador de preguntas (simplificado)
-        session = get_session(session_id)
-        update_session(session_id, total_questions=session["total_questions"] + 1)
-        
-        return {
-            "message": assistant_message,
-            "session_id": session_id
-        }
-
-    except HTTPException:
-        raise
+        return await run_in_threadpool(run_chat_turn, user_message, session_id)
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
     except Exception as e:
         print(f"Error en OpenAI: {str(e)}")
         return {"message": "Error al procesar tu respuesta. Por favor intenta de nuevo.", "error": str(e)}
@@ -434,12 +776,268 @@ async def chat_endpoint(request: Request):
 # ENDPOINT PARA CONTINUAR SESIÓN
 # ============================================
 
-@app.post("/sessions/{session_id}/continue")
-async def continue_session(session_id: str, request: Request):
+@app.post("/sessions/{session_id}/continue", response_model=ChatResponse, response_model_exclude_none=True)
+async def continue_session(session_id: str, data: ContinueSessionRequest):
     """Continúa una sesión existente con un nuevo mensaje."""
-    data = await request.json()
-    data["session_id"] = session_id
-    return await chat_endpoint(request.__class__(scope=request.scope, receive=lambda: data))
+    return await _chat(data.message, session_id)
+
+# ============================================
+# WEBSOCKET DE ENTREVISTA
+# ============================================
+
+# Mientras el último mensaje guardado sea del usuario (otra conexión está
+# generando la respuesta), se consulta la BD cada WS_PENDING_REPLY_POLL segundos
+# durante como mucho WS_PENDING_REPLY_TIMEOUT segundos
+WS_PENDING_REPLY_POLL = 1.0
+WS_PENDING_REPLY_TIMEOUT = 120
+
+# Códigos de cierre propios (rango 4000-4999 reservado para aplicaciones).
+# Al apagarse, uvicorn cierra además todos los sockets con 1012 (Service Restart)
+WS_CLOSE_SESSION_NOT_FOUND = 4404
+WS_CLOSE_HEARTBEAT_TIMEOUT = 4408
+
+async def _ws_send(websocket: WebSocket, payload: dict) -> bool:
+    """Envía un mensaje JSON; devuelve False si el cliente ya no está conectado."""
+    try:
+        await websocket.send_json(payload)
+        return True
+    except (WebSocketDisconnect, RuntimeError):
+        return False
+
+@app.websocket("/ws/sessions/{session_id}")
+async def interview_websocket(websocket: WebSocket, session_id: str, last_message_id: Optional[int] = None):
+    """
+    Canal WebSocket de entrevista para una sesión existente.
+    
+    La sesión se valida una sola vez al conectar y su historial se mantiene en
+    memoria mientras dure la conexión, de modo que cada turno solo transmite
+    el mensaje nuevo.
+    
+    Parámetros:
+    - last_message_id: (opcional) último ID de mensaje recibido; al reconectar
+      solo se reenvían los mensajes posteriores
+    
+    Mensajes del cliente:
+    - {"type": "message", "content": "..."}: nuevo mensaje del candidato
+    - {"type": "pong"} / {"type": "ping"}: heartbeat
+    
+    Mensajes del servidor:
+    - {"type": "history", "messages": [...], "awaiting_reply": bool}: mensajes
+      guardados que el cliente no tiene (al conectar y cuando otra conexión o
+      endpoint guarda mensajes); awaiting_reply indica que el último mensaje
+      del usuario aún no tiene respuesta
+    - {"type": "message", "message": {...}}: confirmación del mensaje del usuario
+    - {"type": "token", "content": "..."}: fragmento de la respuesta en streaming
+    - {"type": "done", "message": {...}}: respuesta completa del asistente
+    - {"type": "ping"} / {"type": "pong"}: heartbeat
+    - {"type": "error", "detail": "..."}
+    """
+    await websocket.accept()
+
+    session = await run_in_threadpool(get_session, session_id)
+    if not session:
+        await _ws_send(websocket, {"type": "error", "detail": "Sesión no encontrada"})
+        await websocket.close(code=WS_CLOSE_SESSION_NOT_FOUND)
+        return
+
+    # Segundos sin tráfico antes de enviar un ping; si tampoco llega respuesta
+    # en el siguiente intervalo se cierra la conexión.
+    heartbeat_interval = float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))
+
+    # Estado de la sesión en memoria durante toda la conexión. Otros escritores
+    # (/chat, /continue, otra pestaña o la conexión anterior de este mismo
+    # cliente, que puede seguir generando una respuesta) guardan mensajes en la
+    # BD, así que el historial se completa desde last_stored_id antes de cada
+    # turno y, mientras haya una respuesta pendiente, cada WS_PENDING_REPLY_POLL.
+    chat_history = []
+    last_stored_id = 0
+    last_stored_role = None
+    failed_turn_ids = set()
+    pending_reply_since = None
+
+    async def sync_history(skip_ids=(), after_id=None) -> bool:
+        """Añade al historial los mensajes nuevos de la BD y los envía al cliente."""
+        nonlocal last_stored_id, last_stored_role, pending_reply_since
+        rows = await run_in_threadpool(get_session_messages_after, session_id, last_stored_id)
+        if rows:
+            chat_history.extend({"role": row["role"], "content": row["content"]} for row in rows)
+            last_stored_id = rows[-1]["id"]
+            last_stored_role = rows[-1]["role"]
+
+        # Una respuesta está pendiente si el último mensaje es del usuario y no
+        # es un turno de esta conexión que ya falló
+        now = time.monotonic()
+        if last_stored_role == "user" and last_stored_id not in failed_turn_ids:
+            if pending_reply_since is None:
+                pending_reply_since = now
+            elif now - pending_reply_since > WS_PENDING_REPLY_TIMEOUT:
+                # La conexión que la generaba no la guardó; se deja de esperar
+                failed_turn_ids.add(last_stored_id)
+                pending_reply_since = None
+        else:
+            pending_reply_since = None
+
+        new_rows = [row for row in rows if row["id"] not in skip_ids and (after_id is None or row["id"] > after_id)]
+        if not new_rows and after_id is None:
+            return True
+        return await _ws_send(websocket, {
+            "type": "history",
+            "messages": new_rows,
+            "awaiting_reply": pending_reply_since is not None
+        })
+
+    if not await sync_history(after_id=last_message_id or 0):
+        return
+
+    awaiting_pong = False
+    last_activity = time.monotonic()
+    try:
+        while True:
+            waiting_reply = pending_reply_since is not None
+            try:
+                frame = await asyncio.wait_for(
+                    websocket.receive(),
+                    timeout=WS_PENDING_REPLY_POLL if waiting_reply else heartbeat_interval
+                )
+            except asyncio.TimeoutError:
+                if waiting_reply and not await sync_history():
+                    return
+                if time.monotonic() - last_activity < heartbeat_interval:
+                    continue
+                if awaiting_pong:
+                    await websocket.close(code=WS_CLOSE_HEARTBEAT_TIMEOUT)
+                    return
+                awaiting_pong = True
+                last_activity = time.monotonic()
+                if not await _ws_send(websocket, {"type": "ping"}):
+                    return
+                continue
+            if frame["type"] == "websocket.disconnect":
+                return
+
+            # Cualquier mensaje del cliente cuenta como señal de vida
+            awaiting_pong = False
+            last_activity = time.monotonic()
+            if frame.get("text") is None:
+                await _ws_send(websocket, {"type": "error", "detail": "Solo se admiten mensajes de texto JSON"})
+                continue
+            try:
+                data = orjson.loads(frame["text"])
+            except orjson.JSONDecodeError:
+                await _ws_send(websocket, {"type": "error", "detail": "JSON inválido"})
+                continue
+            message_type = data.get("type") if isinstance(data, dict) else None
+
+            if message_type == "pong":
+                continue
+            if message_type == "ping":
+                await _ws_send(websocket, {"type": "pong"})
+                continue
+            if message_type != "message":
+                await _ws_send(websocket, {"type": "error", "detail": "Tipo de mensaje no soportado"})
+                continue
+
+            user_message = str(data.get("content") or "").strip()
+            if not user_message:
+                await _ws_send(websocket, {"type": "error", "detail": "Mensaje vacío"})
+                continue
+
+            # Completar el historial con lo que otros hayan guardado mientras tanto
+            if not await sync_history():
+                return
+            if pending_reply_since is not None:
+                await _ws_send(websocket, {
+                    "type": "error",
+                    "detail": "Hay una respuesta pendiente; espera a que llegue antes de enviar otro mensaje"
+                })
+                continue
+
+            messages = build_interview_messages(chat_history, user_message)
+            is_first_turn = not chat_history
+
+            # Guardar mensaje del usuario
+            user_message_id = await run_in_threadpool(save_message, session_id, "user", user_message)
+            if is_first_turn and not session.get("candidate_name"):
+                nombre = extraer_nombre(user_message)
+                if nombre:
+                    await run_in_threadpool(update_session, session_id, candidate_name=nombre)
+                    session["candidate_name"] = nombre
+
+            connected = await _ws_send(websocket, {
+                "type": "message",
+                "message": {"id": user_message_id, "role": "user", "content": user_message}
+            })
+
+            # Si el cliente se desconecta a mitad de la respuesta seguimos
+            # consumiendo el stream para guardarla y poder reenviarla al reconectar
+            chunks = []
+            try:
+                stream = await run_in_threadpool(request_completion, messages, True)
+                async for chunk in iterate_in_threadpool(iter(stream)):
+                    if not chunk.choices:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    if not token:
+                        continue
+                    chunks.append(token)
+                    if connected:
+                        connected = await _ws_send(websocket, {"type": "token", "content": token})
+            except Exception as e:
+                print(f"Error en OpenAI: {str(e)}")
+                if not connected:
+                    return
+                failed_turn_ids.add(user_message_id)
+                await _ws_send(websocket, {
+                    "type": "error",
+                    "detail": "Error al procesar tu respuesta. Por favor intenta de nuevo."
+                })
+                continue
+
+            assistant_message = "".join(chunks).strip()
+
+            # Guardar respuesta del asistente
+            assistant_message_id = await run_in_threadpool(save_message, session_id, "assistant", assistant_message)
+
+            # Actualizar contador de preguntas
+            await run_in_threadpool(increment_session_questions, session_id)
+
+            if not connected:
+                return
+            if not await _ws_send(websocket, {
+                "type": "done",
+                "message": {"id": assistant_message_id, "role": "assistant", "content": assistant_message}
+            }):
+                return
+
+            # Incorporar los mensajes de este turno (y los que otros hayan
+            # intercalado) sin reenviar al cliente los que ya recibió
+            if not await sync_history(skip_ids={user_message_id, assistant_message_id}):
+                return
+    except WebSocketDisconnect:
+        return
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    import argparse
+    import uvicorn
+
+    # Los valores por defecto de los argumentos pueden venir de .env
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Servidor de la API de ByteWise")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")),
+        help="Número de procesos worker (por defecto WEB_CONCURRENCY o 1)"
+    )
+    parser.add_argument("--reload", action="store_true", help="Recarga automática (solo desarrollo, un worker)")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=None if args.reload else args.workers,
+        reload=args.reload,
+        timeout_graceful_shutdown=SHUTDOWN_DRAIN_TIMEOUT
+    )
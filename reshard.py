@@ -0,0 +1,168 @@
+"""
+Reparte las sesiones de ByteWise entre N ficheros SQLite.
+
+Copia sesiones y mensajes desde la distribución actual (por defecto el
+fichero único bytewise.db) a una nueva con otro número de shards. Los
+ficheros de origen no se modifican; al terminar basta con arrancar el
+servidor con DATABASE_SHARDS=<N>.
+
+Desde un único fichero los IDs de mensaje se conservan. Desde varios shards
+(donde pueden repetirse) se renumeran por encima del mayor ID de origen. En
+ambos casos los mensajes nuevos reciben IDs mayores que cualquier cursor que
+tenga un cliente.
+
+Si algún fichero de destino ya existe (por ejemplo el bytewise.db original
+al volver a un único fichero) el script se detiene, salvo que se indique
+--move-aside, que lo renombra a <fichero>.bak-<fecha> antes de copiar.
+
+Ejecutar con el servidor parado:
+
+    python reshard.py --to 4                          # de bytewise.db a 4 shards
+    python reshard.py --from 4 --to 8                 # rebalancear de 4 a 8 shards
+    python reshard.py --from 4 --to 1 --move-aside    # volver a un único fichero
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import main
+
+
+def count_rows(paths: list) -> tuple:
+    """Cuenta sesiones y mensajes en un conjunto de ficheros."""
+    sessions = messages = 0
+    for path in paths:
+        with main.get_db(path) as conn:
+            sessions += conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            messages += conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    return sessions, messages
+
+
+def remove_files(paths: list):
+    """Borra ficheros SQLite junto con sus ficheros WAL."""
+    for path in paths:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def move_aside(paths: list) -> list:
+    """Renombra ficheros SQLite (y sus ficheros WAL) a <fichero>.bak-<fecha>."""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    moved = []
+    for path in paths:
+        backup = f"{path}.bak-{stamp}"
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.rename(path + suffix, backup + suffix)
+        moved.append(backup)
+    return moved
+
+
+def max_message_id(path: str) -> int:
+    """Mayor ID de mensaje que ha llegado a asignar un fichero (incluye mensajes borrados)."""
+    with main.get_db(path) as conn:
+        current = conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'messages'").fetchone()
+    return max(current, sequence[0] if sequence else 0)
+
+
+def reshard(source_shards: int, target_shards: int, database_path: str = None, move_existing: bool = False):
+    """Copia todas las sesiones de source_shards a target_shards ficheros."""
+    source_paths = main.get_shard_paths(source_shards, database_path)
+    target_paths = main.get_shard_paths(target_shards, database_path)
+
+    missing = [path for path in source_paths if not os.path.exists(path)]
+    if missing:
+        raise SystemExit(f"No existen los ficheros de origen: {', '.join(missing)}")
+    existing = [path for path in target_paths if os.path.exists(path)]
+    if existing and not move_existing:
+        raise SystemExit(
+            f"Los ficheros de destino ya existen: {', '.join(existing)}. "
+            "Muévelos o usa --move-aside para renombrarlos a .bak-<fecha>"
+        )
+    for backup in move_aside(existing):
+        print(f"Fichero existente movido a {backup}")
+
+    # Crear el esquema en los shards de destino
+    main.configure_shards(target_shards, database_path)
+    main.init_database()
+
+    # Los clientes guardan IDs de mensaje como cursores (?last_message_id=,
+    # ?after_message_id=): ningún mensaje nuevo puede quedar por debajo de ellos
+    preserve_ids = source_shards == 1
+    max_source_id = max(max_message_id(path) for path in source_paths)
+
+    targets = {path: sqlite3.connect(path) for path in target_paths}
+    try:
+        for conn in targets.values():
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'messages'")
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('messages', ?)", (max_source_id,))
+
+        for source_path in source_paths:
+            with main.get_db(source_path) as source:
+                for row in source.execute("SELECT * FROM sessions"):
+                    session = dict(row)
+                    columns = ", ".join(session)
+                    placeholders = ", ".join("?" for _ in session)
+                    targets[main.shard_path(session["id"])].execute(
+                        f"INSERT INTO sessions ({columns}) VALUES ({placeholders})",
+                        list(session.values())
+                    )
+
+                # Al renumerar, el orden dentro de cada sesión se conserva: cada
+                # sesión vive en un único shard de origen y se copia por orden de ID
+                for row in source.execute(
+                    "SELECT id, session_id, role, content, created_at FROM messages ORDER BY id"
+                ):
+                    target = targets[main.shard_path(row["session_id"])]
+                    if preserve_ids:
+                        target.execute(
+                            "INSERT INTO messages (id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                            tuple(row)
+                        )
+                    else:
+                        target.execute(
+                            "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                            tuple(row)[1:]
+                        )
+        for conn in targets.values():
+            conn.commit()
+    except BaseException:
+        # No dejar shards a medio copiar: la siguiente ejecución se negaría a sobrescribirlos
+        for conn in targets.values():
+            conn.close()
+        remove_files(target_paths)
+        raise
+    for conn in targets.values():
+        conn.close()
+
+    source_counts = count_rows(source_paths)
+    target_counts = count_rows(target_paths)
+    if source_counts != target_counts:
+        raise SystemExit(f"Recuento distinto tras copiar: origen {source_counts}, destino {target_counts}")
+
+    print(f"Copiadas {target_counts[0]} sesiones y {target_counts[1]} mensajes a {target_shards} shard(s):")
+    if not preserve_ids:
+        print(f"Los IDs de mensaje se han renumerado a partir de {max_source_id + 1}: "
+              "los clientes con cursores antiguos recibirán de nuevo los mensajes de sus sesiones")
+    for path in target_paths:
+        print(f"  {path}: {count_rows([path])[0]} sesiones")
+    print(f"Arranca el servidor con DATABASE_SHARDS={target_shards}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reparte las sesiones de ByteWise entre N ficheros SQLite")
+    parser.add_argument("--from", dest="source", type=int, default=1, help="Número de shards actual (por defecto 1)")
+    parser.add_argument("--to", dest="target", type=int, required=True, help="Número de shards de destino")
+    parser.add_argument("--db", default=None, help="Ruta base de la base de datos (por defecto bytewise.db)")
+    parser.add_argument(
+        "--move-aside", action="store_true",
+        help="Renombrar a .bak-<fecha> los ficheros de destino que ya existan en lugar de abortar"
+    )
+    args = parser.parse_args()
+
+    if args.source < 1 or args.target < 1 or args.source == args.target:
+        parser.error("--from y --to deben ser >= 1 y distintos")
+    reshard(args.source, args.target, args.db, args.move_aside)